@@ -1,13 +1,52 @@
-from web3 import Web3
+from web3 import AsyncWeb3, Web3
 from eth_utils import to_checksum_address
+import aiohttp
+import asyncio
+import functools
 import json
 import os
+import shelve
+import sys
+import threading
+from decimal import Context, Decimal
 from dotenv import load_dotenv
 from typing import Dict, Tuple, Optional
 
 # Load environment variables
 load_dotenv()
 
+# Multicall3 is deployed at the same address on mainnet and most EVM chains
+MULTICALL_ADDRESS = Web3.to_checksum_address(os.getenv('MULTICALL_ADDRESS', '0xcA11bde05977b3631167028862bE2a173976CA11'))
+
+# Maximum calls per JSON-RPC batch (Infura allows 1000, many public RPCs cap at 100)
+BATCH_SIZE = int(os.getenv('RPC_BATCH_SIZE', '100'))
+
+# On-disk cache of immutable token metadata, keyed by chain id and token address
+TOKEN_META_CACHE = os.getenv('TOKEN_META_CACHE', '.token_meta')
+
+# Parse ABIs once per process
+with open('abis/ERC20.json', 'r') as f:
+    ERC20_ABI = json.load(f)
+
+with open('abis/Multicall3.json', 'r') as f:
+    MULTICALL_ABI = json.load(f)
+
+# Balance report separators
+HEADER_RULE = "=" * 40
+ROW_RULE = "-" * 40
+
+# Enough precision for any uint256 amount (78 digits), so scaling never rounds
+UINT256_CONTEXT = Context(prec=78)
+
+def scale_balance(raw_balance: int, decimals: int) -> Decimal:
+    """Convert a raw token amount to token units without float rounding"""
+    return Decimal(raw_balance).scaleb(-decimals, UINT256_CONTEXT)
+
+@functools.lru_cache(maxsize=4096)
+def checksum_address(address: str) -> str:
+    """Checksum an address, memoized since it hashes with keccak256 every call"""
+    return Web3.to_checksum_address(address)
+
 class BalanceChecker:
     def __init__(self):
         # Initialize connection and credentials
@@ -17,64 +56,143 @@ class BalanceChecker:
         if not all([self.node_url, self.wallet_address]):
             raise ValueError("Missing required environment variables")
         
-        # Initialize Web3
-        self.w3 = Web3(Web3.HTTPProvider(self.node_url))
+        # Initialize async Web3; the HTTP session is attached in __aenter__
+        self.w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(self.node_url))
+        self.session = None
+        self.chain_id = None
         self.wallet_address = Web3.to_checksum_address(self.wallet_address)
         
-        # Load ERC20 ABI
-        with open('abis/ERC20.json', 'r') as f:
-            self.erc20_abi = json.load(f)
+        # Token metadata cache: in-memory hot path in front of the on-disk store
+        self.token_meta = {}
+        self.token_meta_store = shelve.open(TOKEN_META_CACHE)
+        
+        # Contract instances and bound read calls, reused across lookups
+        self.token_contracts = {}
+        self.token_calls = {}
+        
+        # Load Multicall3 contract for batching reads into a single eth_call
+        self.multicall = self.w3.eth.contract(
+            address=MULTICALL_ADDRESS,
+            abi=MULTICALL_ABI
+        )
+        self.multicall_available = True
+
+    async def __aenter__(self):
+        # Reuse a single keep-alive session for every RPC instead of one per request,
+        # with a pool large enough for the concurrent fallback fan-out
+        connector = aiohttp.TCPConnector(limit=64, ttl_dns_cache=300, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=10)
+        )
+        try:
+            await self.w3.provider.cache_async_session(self.session)
+            self.chain_id = await self.w3.eth.chain_id
+        except Exception:
+            # __aexit__ doesn't run when entering fails, release what we opened
+            await self.session.close()
+            self.token_meta_store.close()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        self.token_meta_store.close()
 
     def validate_address(self, address: str) -> str:
         """Validate and convert address to checksum format"""
         try:
-            return Web3.to_checksum_address(address.strip())
+            return checksum_address(address.strip())
         except Exception as e:
             raise ValueError(f"Invalid Ethereum address: {address}")
 
-    def get_eth_balance(self) -> float:
+    def get_token_contract(self, token_address: str):
+        """Get token contract instance for a checksummed address"""
+        token_contract = self.token_contracts.get(token_address)
+        if token_contract is None:
+            token_contract = self.w3.eth.contract(
+                address=token_address,
+                abi=ERC20_ABI
+            )
+            self.token_contracts[token_address] = token_contract
+        return token_contract
+
+    def get_token_calls(self, token_address: str) -> Tuple:
+        """Get the bound symbol, name, decimals and balanceOf calls for a token"""
+        calls = self.token_calls.get(token_address)
+        if calls is None:
+            functions = self.get_token_contract(token_address).functions
+            calls = (
+                functions.symbol(),
+                functions.name(),
+                functions.decimals(),
+                functions.balanceOf(self.wallet_address)
+            )
+            self.token_calls[token_address] = calls
+        return calls
+
+    def get_cached_token_info(self, token_address: str) -> Optional[Tuple[str, str, int]]:
+        """Get token symbol, name, and decimals from cache, None if not cached"""
+        key = f"{self.chain_id}:{token_address}"
+        if key not in self.token_meta:
+            if key not in self.token_meta_store:
+                return None
+            self.token_meta[key] = self.token_meta_store[key]
+        return self.token_meta[key]
+
+    def cache_token_info(self, token_address: str, token_info: Tuple[str, str, int]):
+        """Store token metadata; symbol, name and decimals never change for an ERC20"""
+        key = f"{self.chain_id}:{token_address}"
+        self.token_meta[key] = token_info
+        self.token_meta_store[key] = token_info
+
+    async def get_eth_balance(self) -> Decimal:
         """Get ETH balance"""
         try:
-            balance_wei = self.w3.eth.get_balance(self.wallet_address)
-            return float(Web3.from_wei(balance_wei, 'ether'))
+            balance_wei = await self.w3.eth.get_balance(self.wallet_address)
+            return Web3.from_wei(balance_wei, 'ether')
         except Exception as e:
             print(f"Error getting ETH balance: {e}")
-            return 0.0
+            return Decimal(0)
+
+    async def fetch_token_info(self, token_address: str) -> Tuple[str, str, int]:
+        """Fetch token symbol, name, and decimals for an already checksummed address"""
+        cached = self.get_cached_token_info(token_address)
+        if cached:
+            return cached
+        
+        # The three reads are independent, issue them concurrently
+        symbol_call, name_call, decimals_call, _ = self.get_token_calls(token_address)
+        symbol, name, decimals = await asyncio.gather(
+            symbol_call.call(),
+            name_call.call(),
+            decimals_call.call()
+        )
+        
+        self.cache_token_info(token_address, (symbol, name, decimals))
+        return symbol, name, decimals
 
-    def get_token_info(self, token_address: str) -> Tuple[str, str, int]:
+    async def get_token_info(self, token_address: str) -> Tuple[str, str, int]:
         """Get token symbol, name, and decimals"""
         try:
-            token_contract = self.w3.eth.contract(
-                address=self.validate_address(token_address),
-                abi=self.erc20_abi
-            )
-            
-            symbol = token_contract.functions.symbol().call()
-            name = token_contract.functions.name().call()
-            decimals = token_contract.functions.decimals().call()
-            
-            return symbol, name, decimals
+            return await self.fetch_token_info(self.validate_address(token_address))
         except Exception as e:
             print(f"Error getting token info: {e}")
             return None, None, None
 
-    def get_token_balance(self, token_address: str) -> Tuple[float, Dict]:
+    async def get_token_balance(self, token_address: str) -> Tuple[Decimal, Dict]:
         """Get token balance and information"""
         try:
             token_address = self.validate_address(token_address)
-            token_contract = self.w3.eth.contract(
-                address=token_address,
-                abi=self.erc20_abi
-            )
             
             # Get token info
-            symbol, name, decimals = self.get_token_info(token_address)
+            symbol, name, decimals = await self.fetch_token_info(token_address)
             if not all([symbol, name, decimals]):
-                return 0.0, {}
+                return Decimal(0), {}
             
             # Get balance
-            balance = token_contract.functions.balanceOf(self.wallet_address).call()
-            balance_formatted = float(balance) / (10 ** decimals)
+            balance = await self.get_token_calls(token_address)[3].call()
+            balance_formatted = scale_balance(balance, decimals)
             
             return balance_formatted, {
                 'symbol': symbol,
@@ -85,104 +203,293 @@ class BalanceChecker:
             }
         except Exception as e:
             print(f"Error getting token balance: {e}")
-            return 0.0, {}
+            return Decimal(0), {}
 
-    def get_all_token_balances(self, token_addresses: list) -> Dict:
-        """Get balances for multiple tokens"""
-        balances = {}
+    def decode_result(self, fn, return_data: bytes):
+        """Decode raw call output for a contract function, None if it failed"""
+        if not return_data:
+            return None
+        try:
+            output_types = [output['type'] for output in fn.abi['outputs']]
+            return self.w3.codec.decode(output_types, return_data)[0]
+        except Exception:
+            return None
+
+    async def aggregate(self, calls: list) -> list:
+        """Execute contract function calls in a single eth_call via Multicall3.
+
+        Calls are allowed to fail individually; failed or undecodable results are None.
+        """
+        results = await self.multicall.functions.aggregate3([
+            (fn.address, True, fn._encode_transaction_data()) for fn in calls
+        ]).call()
+        return [
+            self.decode_result(fn, return_data) if success else None
+            for fn, (success, return_data) in zip(calls, results)
+        ]
+
+    async def batch_call(self, calls: list) -> list:
+        """Execute contract function calls as JSON-RPC batch requests.
+
+        Calls are sent BATCH_SIZE at a time to stay under provider batch limits.
+        Failed or undecodable results are None.
+        """
+        results = []
+        for start in range(0, len(calls), BATCH_SIZE):
+            chunk = calls[start:start + BATCH_SIZE]
+            payload = [
+                {
+                    'jsonrpc': '2.0',
+                    'id': i,
+                    'method': 'eth_call',
+                    'params': [{'to': fn.address, 'data': fn._encode_transaction_data()}, 'latest']
+                }
+                for i, fn in enumerate(chunk)
+            ]
+            
+            # HTTP 413 raises here; a -32600 rejection comes back as a single error object
+            async with self.session.post(self.node_url, json=payload) as response:
+                response.raise_for_status()
+                body = await response.json(content_type=None)
+            if not isinstance(body, list):
+                raise ValueError(f"Batch request rejected: {body.get('error')}")
+            
+            responses = {item.get('id'): item.get('result') for item in body}
+            for i, fn in enumerate(chunk):
+                result = responses.get(i)
+                results.append(self.decode_result(fn, bytes.fromhex(result[2:])) if result else None)
         
-        # Get ETH balance first
-        eth_balance = self.get_eth_balance()
-        balances['ETH'] = {
-            'symbol': 'ETH',
-            'name': 'Ethereum',
-            'balance': eth_balance,
-            'address': 'Native ETH'
-        }
+        return results
+
+    async def read_calls(self, calls: list) -> list:
+        """Execute contract reads in one round-trip, via Multicall3 when deployed
+        and JSON-RPC batch requests otherwise"""
+        if self.multicall_available:
+            try:
+                return await self.aggregate(calls)
+            except Exception as e:
+                # Multicall3 not deployed on this chain, stick to batch requests
+                print(f"Multicall unavailable, falling back to batch requests: {e}")
+                self.multicall_available = False
+        return await self.batch_call(calls)
+
+    async def get_raw_token_balances(self, tokens: list) -> list:
+        """Get raw balanceOf for checksummed token addresses in one round-trip, None where a read failed"""
+        return await self.read_calls([self.get_token_calls(token_address)[3] for token_address in tokens])
+
+    async def get_held_token_balances(self, tokens: list, raw_balances: list) -> list:
+        """Turn raw balances into (balance, token_info) pairs, fetching metadata only for held tokens"""
+        held = []
+        for token_address, balance in zip(tokens, raw_balances):
+            if balance is None:
+                print(f"Error getting token balance: {token_address}")
+            elif balance > 0:
+                held.append((token_address, balance))
+        
+        # Second pass: metadata only for held tokens we haven't seen before
+        uncached = [token_address for token_address, _ in held if self.get_cached_token_info(token_address) is None]
+        if uncached:
+            results = await self.read_calls([
+                call for token_address in uncached for call in self.get_token_calls(token_address)[:3]
+            ])
+            for i, token_address in enumerate(uncached):
+                symbol, name, decimals = results[3 * i:3 * i + 3]
+                if symbol and decimals:
+                    self.cache_token_info(token_address, (symbol, name or symbol, decimals))
+        
+        token_balances = []
+        for token_address, balance in held:
+            token_info = self.get_cached_token_info(token_address)
+            if token_info is None:
+                print(f"Error getting token info: {token_address}")
+                continue
+            symbol, name, decimals = token_info
+            token_balances.append((scale_balance(balance, decimals), {
+                'symbol': symbol,
+                'name': name,
+                'decimals': decimals,
+                'address': token_address,
+                'raw_balance': balance
+            }))
         
-        # Get token balances
+        return token_balances
+
+    async def get_all_token_balances(self, token_addresses: list) -> Dict:
+        """Get balances for multiple tokens"""
+        tokens = []
         for address in token_addresses:
             try:
-                balance, token_info = self.get_token_balance(address)
-                if balance > 0 and token_info:  # Only include tokens with positive balance
-                    balances[token_info['symbol']] = {
-                        'symbol': token_info['symbol'],
-                        'name': token_info['name'],
-                        'balance': balance,
-                        'address': token_info['address']
-                    }
-            except Exception as e:
+                tokens.append(self.validate_address(address))
+            except ValueError as e:
                 print(f"Error processing token {address}: {e}")
-                continue
         
-        return balances
+        return await self.resolve_balances(self.get_eth_balance(), tokens, [self.get_raw_token_balances(tokens)])
+
+    async def resolve_balances(self, eth_lookup, tokens: list, balance_lookups: list) -> Dict:
+        """Combine an ETH balance lookup with get_raw_token_balances lookups covering
+        tokens in order, then fetch metadata for the held ones"""
+        try:
+            eth_balance, *chunks = await asyncio.gather(eth_lookup, *balance_lookups, return_exceptions=True)
+            for result in [eth_balance, *chunks]:
+                if isinstance(result, Exception):
+                    raise result
+            raw_balances = [balance for chunk in chunks for balance in chunk]
+            token_balances = await self.get_held_token_balances(tokens, raw_balances)
+        except Exception as e:
+            # Node rejected batching altogether, query every token concurrently
+            print(f"Batch requests unavailable, falling back to individual calls: {e}")
+            eth_balance, *token_balances = await asyncio.gather(
+                self.get_eth_balance(),
+                *(self.get_token_balance(address) for address in tokens)
+            )
+        
+        return collect_balances(eth_balance, token_balances)
+
+def collect_balances(eth_balance: Decimal, token_balances: list) -> Dict:
+    """Combine ETH and (balance, token_info) results into a balances dict keyed by symbol"""
+    balances = {}
+    
+    balances['ETH'] = {
+        'symbol': 'ETH',
+        'name': 'Ethereum',
+        'balance': eth_balance,
+        'address': 'Native ETH'
+    }
+    
+    # Only include tokens with positive balance
+    for balance, token_info in token_balances:
+        if balance > 0 and token_info:
+            balances[token_info['symbol']] = {
+                'symbol': token_info['symbol'],
+                'name': token_info['name'],
+                'balance': balance,
+                'address': token_info['address']
+            }
+    
+    return balances
 
 def format_balance_output(balances: Dict) -> str:
     """Format balance information for display"""
-    output = "\n=== Wallet Balance Report ===\n"
+    parts = [
+        "\n=== Wallet Balance Report ===\n",
+        f"Wallet: {os.getenv('WALLET_ADDRESS')}\n",
+        HEADER_RULE + "\n\n"
+    ]
     
-    # Add wallet address
-    output += f"Wallet: {os.getenv('WALLET_ADDRESS')}\n"
-    output += "=" * 40 + "\n\n"
+    # Display balances sorted by symbol
+    for symbol, info in sorted(balances.items()):
+        parts.extend([
+            f"Token: {info['name']} ({symbol})\n",
+            f"Balance: {info['balance']:.8f}\n",
+            f"Address: {info['address']}\n",
+            ROW_RULE + "\n"
+        ])
     
-    # Sort by symbol
-    sorted_balances = dict(sorted(balances.items()))
+    return "".join(parts)
+
+def start_stdin_reader() -> asyncio.Queue:
+    """Read stdin lines on a daemon thread into a queue, None at EOF.
+
+    Unlike input() in an executor, a pending read doesn't keep asyncio.run
+    from exiting on Ctrl-C.
+    """
+    loop = asyncio.get_running_loop()
+    lines = asyncio.Queue()
     
-    # Display balances
-    for symbol, info in sorted_balances.items():
-        output += f"Token: {info['name']} ({symbol})\n"
-        output += f"Balance: {info['balance']:.8f}\n"
-        output += f"Address: {info['address']}\n"
-        output += "-" * 40 + "\n"
+    def read_stdin():
+        while True:
+            line = sys.stdin.readline()
+            try:
+                loop.call_soon_threadsafe(lines.put_nowait, line.rstrip('\n') if line else None)
+            except RuntimeError:
+                # Event loop already closed
+                return
+            if not line:
+                return
     
-    return output
+    threading.Thread(target=read_stdin, daemon=True).start()
+    return lines
 
-def main():
-    try:
-        checker = BalanceChecker()
+async def read_input(lines: asyncio.Queue, prompt: str = "") -> str:
+    """input() for the event loop, reading from start_stdin_reader's queue"""
+    print(prompt, end="", flush=True)
+    line = await lines.get()
+    if line is None:
+        raise EOFError
+    return line
+
+async def menu(checker: BalanceChecker):
+    lines = start_stdin_reader()
+    while True:
+        print("\nToken Balance Checker Menu:")
+        print("1. Check ETH balance")
+        print("2. Check specific token balance")
+        print("3. Check multiple token balances")
+        print("4. Exit")
         
-        while True:
-            print("\nToken Balance Checker Menu:")
-            print("1. Check ETH balance")
-            print("2. Check specific token balance")
-            print("3. Check multiple token balances")
-            print("4. Exit")
+        choice = await read_input(lines, "\nEnter your choice (1-4): ")
+        
+        if choice == "1":
+            eth_balance = await checker.get_eth_balance()
+            print(f"\nETH Balance: {eth_balance:.8f} ETH")
             
-            choice = input("\nEnter your choice (1-4): ")
+        elif choice == "2":
+            token_address = (await read_input(lines, "\nEnter token contract address: ")).strip()
+            balance, token_info = await checker.get_token_balance(token_address)
+            if token_info:
+                print(f"\nToken: {token_info['name']} ({token_info['symbol']})")
+                print(f"Balance: {balance:.8f}")
+                print(f"Contract: {token_info['address']}")
             
-            if choice == "1":
-                eth_balance = checker.get_eth_balance()
-                print(f"\nETH Balance: {eth_balance:.8f} ETH")
-                
-            elif choice == "2":
-                token_address = input("\nEnter token contract address: ").strip()
-                balance, token_info = checker.get_token_balance(token_address)
-                if token_info:
-                    print(f"\nToken: {token_info['name']} ({token_info['symbol']})")
-                    print(f"Balance: {balance:.8f}")
-                    print(f"Contract: {token_info['address']}")
-                
-            elif choice == "3":
-                addresses = []
-                print("\nEnter token addresses (one per line, empty line to finish):")
-                while True:
-                    addr = input().strip()
-                    if not addr:
-                        break
-                    addresses.append(addr)
-                
-                balances = checker.get_all_token_balances(addresses)
-                print(format_balance_output(balances))
+        elif choice == "3":
+            # Start balanceOf reads for addresses as they come in so the RPCs
+            # overlap with typing; metadata is fetched afterwards for held tokens only
+            eth_lookup = asyncio.create_task(checker.get_eth_balance())
+            tokens = []
+            seen = set()
+            pending = []
+            balance_lookups = []
+            print("\nEnter token addresses (one per line, empty line to finish):")
+            while True:
+                addr = (await read_input(lines)).strip()
+                if not addr:
+                    break
                 
-            elif choice == "4":
-                print("\nGoodbye!")
-                break
-                
-            else:
-                print("\nInvalid choice. Please try again.")
+                # Reject bad input and duplicates before they reach the RPC path
+                try:
+                    addr = checker.validate_address(addr)
+                except ValueError as e:
+                    print(e)
+                    continue
+                if addr in seen:
+                    continue
+                seen.add(addr)
+                tokens.append(addr)
+                pending.append(addr)
+                # Start the read once no more input is buffered: a typed address goes out
+                # right away, a pasted list shares one read
+                if lines.empty():
+                    balance_lookups.append(asyncio.create_task(checker.get_raw_token_balances(pending)))
+                    pending = []
+            if pending:
+                balance_lookups.append(asyncio.create_task(checker.get_raw_token_balances(pending)))
+            
+            balances = await checker.resolve_balances(eth_lookup, tokens, balance_lookups)
+            print(format_balance_output(balances))
+            
+        elif choice == "4":
+            print("\nGoodbye!")
+            break
             
+        else:
+            print("\nInvalid choice. Please try again.")
+
+async def main():
+    try:
+        async with BalanceChecker() as checker:
+            await menu(checker)
     except Exception as e:
         print(f"An error occurred: {e}")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,18 +1,53 @@
 from eth_account import Account
 from mnemonic import Mnemonic
+import argparse
+import hashlib
+import os
+import re
 import secrets
+import tempfile
+import unicodedata
 from eth_utils import to_hex
 
+# BIP-39 seed derivation parameters (empty passphrase)
+BIP39_SEED_SALT = b'mnemonic'
+BIP39_SEED_ROUNDS = 2048
+
+# Parse the English wordlist once per process
+MNEMO = Mnemonic("english")
+
+# .env lines rewritten with the new wallet credentials
+ENV_PRIVATE_KEY_RE = re.compile(r'^ETHEREUM_PRIVATE_KEY=.*$', re.M)
+ENV_WALLET_ADDRESS_RE = re.compile(r'^WALLET_ADDRESS=.*$', re.M)
+
+def mnemonic_to_seed(mnemonic: str) -> bytes:
+    """Derive the 64-byte BIP-39 seed using OpenSSL's PBKDF2-HMAC-SHA512"""
+    mnemonic_bytes = unicodedata.normalize('NFKD', mnemonic).encode('utf-8')
+    return hashlib.pbkdf2_hmac('sha512', mnemonic_bytes, BIP39_SEED_SALT, BIP39_SEED_ROUNDS, dklen=64)
+
+def generate_wallet():
+    """Generate an Ethereum wallet straight from CSPRNG entropy (no mnemonic)"""
+    # Skips mnemonic encoding and the 2048-round PBKDF2 seed stretch entirely
+    private_key = '0x' + secrets.token_bytes(32).hex()
+    account = Account.from_key(private_key)
+    address = account.address
+    
+    print("\nWallet Details:")
+    print(f"Address: {address}")
+    print(f"\nPrivate Key: {private_key}")
+    print("\nIMPORTANT: Save your private key securely! There is no mnemonic backup.")
+    return private_key, address
+
 def generate_wallet_with_mnemonic():
     """Generate an Ethereum wallet with mnemonic phrase"""
-    # Generate mnemonic (seed phrase)
-    mnemo = Mnemonic("english")
-    mnemonic = mnemo.generate(strength=256)  # 24 words
-    seed = mnemo.to_seed(mnemonic)
+    # Generate mnemonic (seed phrase) from 256 bits of OS entropy
+    entropy = secrets.token_bytes(32)
+    mnemonic = MNEMO.to_mnemonic(entropy)  # 24 words
+    seed = mnemonic_to_seed(mnemonic)
     
     # Generate private key from seed
-    private_key = to_hex(seed[:32])  # Take first 32 bytes for private key
-    account = Account.from_key(private_key)
+    account = Account.from_key(seed[:32])  # Take first 32 bytes for private key
+    private_key = to_hex(account.key)
     address = account.address
     
     print("\nWallet Details:")
@@ -23,43 +58,61 @@ def generate_wallet_with_mnemonic():
     print("\nIMPORTANT: Save your mnemonic phrase securely! It's your wallet backup.")
     return private_key, address, mnemonic
 
+def update_env_file(private_key: str, address: str, path: str = '.env'):
+    """Write wallet credentials into the .env file atomically"""
+    with open(path, 'r') as file:
+        env_contents = file.read()
+    
+    private_key = private_key[2:] if private_key.startswith("0x") else private_key
+    env_contents = ENV_PRIVATE_KEY_RE.sub(f'ETHEREUM_PRIVATE_KEY={private_key}', env_contents)
+    env_contents = ENV_WALLET_ADDRESS_RE.sub(f'WALLET_ADDRESS={address}', env_contents)
+    
+    # Swap in a fully written temp file so an interrupted run can't leave a truncated .env
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.env.')
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.write(env_contents)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate an Ethereum wallet")
+    parser.add_argument('--mnemonic', action='store_true',
+                        help="also generate a recoverable 24-word mnemonic phrase (slower)")
+    args = parser.parse_args()
+    
     try:
-        # Generate wallet with mnemonic
-        private_key, address, mnemonic = generate_wallet_with_mnemonic()
+        if args.mnemonic:
+            # Generate wallet with mnemonic
+            private_key, address, mnemonic = generate_wallet_with_mnemonic()
+        else:
+            private_key, address = generate_wallet()
+            mnemonic = None
         
         # Update .env file
-        with open('.env', 'r') as file:
-            env_contents = file.readlines()
-        
-        # Update the relevant lines
-        for i, line in enumerate(env_contents):
-            if 'ETHEREUM_PRIVATE_KEY=' in line:
-                env_contents[i] = f'ETHEREUM_PRIVATE_KEY={private_key[2:] if private_key.startswith("0x") else private_key}\n'
-            elif 'WALLET_ADDRESS=' in line:
-                env_contents[i] = f'WALLET_ADDRESS={address}\n'
-        
-        # Write back to .env
-        with open('.env', 'w') as file:
-            file.writelines(env_contents)
+        update_env_file(private_key, address)
         
         # Save mnemonic to a separate secure file
-        with open('wallet_backup.txt', 'w') as file:
-            file.write("IMPORTANT: Keep this file secure and never share it with anyone!\n\n")
-            file.write("Ethereum Wallet Backup\n")
-            file.write("=====================\n\n")
-            file.write(f"Wallet Address: {address}\n\n")
-            file.write("Mnemonic Phrase (24 words):\n")
-            file.write(f"{mnemonic}\n\n")
-            file.write("Instructions:\n")
-            file.write("1. Write down these 24 words on paper\n")
-            file.write("2. Store the paper in a secure location\n")
-            file.write("3. Never share your mnemonic phrase with anyone\n")
-            file.write("4. You can restore your wallet using these words\n")
+        if mnemonic:
+            with open('wallet_backup.txt', 'w') as file:
+                file.write("IMPORTANT: Keep this file secure and never share it with anyone!\n\n")
+                file.write("Ethereum Wallet Backup\n")
+                file.write("=====================\n\n")
+                file.write(f"Wallet Address: {address}\n\n")
+                file.write("Mnemonic Phrase (24 words):\n")
+                file.write(f"{mnemonic}\n\n")
+                file.write("Instructions:\n")
+                file.write("1. Write down these 24 words on paper\n")
+                file.write("2. Store the paper in a secure location\n")
+                file.write("3. Never share your mnemonic phrase with anyone\n")
+                file.write("4. You can restore your wallet using these words\n")
         
         print("\nWallet details have been added to your .env file!")
-        print("Mnemonic phrase has been saved to 'wallet_backup.txt'")
-        print("\nWARNING: Make sure to backup your mnemonic phrase and delete wallet_backup.txt after securing it!")
+        if mnemonic:
+            print("Mnemonic phrase has been saved to 'wallet_backup.txt'")
+            print("\nWARNING: Make sure to backup your mnemonic phrase and delete wallet_backup.txt after securing it!")
         
     except Exception as e:
         print(f"An error occurred: {e}")
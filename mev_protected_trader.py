@@ -1,20 +1,113 @@
-from web3 import Web3
+from web3 import AsyncWeb3, Web3
+from web3.exceptions import ContractLogicError, TransactionNotFound
+from web3.middleware import async_construct_simple_cache_middleware
 from eth_account.account import Account
 from eth_account.signers.local import LocalAccount
 from eth_utils import to_checksum_address
+import aiohttp
+import eth_abi
+import functools
+import asyncio
 import json
+import logging
 import os
+import queue
+import random
+import shelve
+import statistics
+import sys
 import time
-from decimal import Decimal
+from logging.handlers import QueueHandler, QueueListener
 from typing import Tuple, Optional
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Trading output; file logging goes through a queue so its I/O happens off the event loop
+logger = logging.getLogger('mev')
+
 # Constants
 UNISWAP_V2_ROUTER = "0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D"
 WETH_ADDRESS = Web3.to_checksum_address(os.getenv('WETH_ADDRESS', '0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2'))
+MULTICALL_ADDRESS = Web3.to_checksum_address(os.getenv('MULTICALL_ADDRESS', '0xcA11bde05977b3631167028862bE2a173976CA11'))
+
+# Wei amounts, precomputed instead of going through Web3.to_wei per call
+ONE_ETHER = 10**18
+TENTH_ETHER = 10**17
+MAX_UINT256 = 2**256 - 1
+MIN_ETH_BALANCE = 10**16  # Keep 0.01 ETH for future gas
+MAX_GAS_PRICE_WEI = 300 * 10**9  # Maximum gas price willing to pay
+DEFAULT_PRIORITY_FEE = 2 * 10**9
+MAX_PRIORITY_FEE = 3 * 10**9
+
+# Fixed-signature calls on the hot path are encoded with eth_abi and selectors
+# computed once, instead of through the ContractFunction pipeline
+CALL_SIGNATURES = {
+    'getAmountsOut': ['uint256', 'address[]'],
+    'swapExactETHForTokens': ['uint256', 'address[]', 'address', 'uint256'],
+    'swapExactTokensForETH': ['uint256', 'uint256', 'address[]', 'address', 'uint256'],
+    'approve': ['address', 'uint256'],
+    'balanceOf': ['address'],
+}
+SELECTORS = {
+    name: Web3.keccak(text=f"{name}({','.join(types)})")[:4]
+    for name, types in CALL_SIGNATURES.items()
+}
+
+# On-disk cache of immutable token metadata, keyed by chain id and token address
+TRADER_META_CACHE = os.getenv('TRADER_META_CACHE', '.token_meta_trader')
+
+# How long recent RPC results are reused (seconds); the latest block lives about a block time
+LATEST_BLOCK_TTL = 2.0
+
+# Transaction submissions per trade, including re-signed replacements
+MAX_SEND_ATTEMPTS = 3
+
+# Receipt polling; blocks land every ~12 s so faster polling only adds load on the node
+RECEIPT_POLL_LATENCY = 2.0
+RECEIPT_TIMEOUT = 180
+
+# Parse ABIs once per process
+ABIS = {}
+for abi_file in ('ERC20.json', 'UniswapV2Router02.json', 'Multicall3.json'):
+    with open(f'abis/{abi_file}', 'r') as f:
+        ABIS[abi_file] = json.load(f)
+
+def setup_logging() -> Optional[QueueListener]:
+    """Send the trader's log records to LOG_FILE through a queue drained by a background
+    thread, or straight to stdout so they stay in order with the menu's prompts"""
+    logger.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    logger.propagate = False
+    
+    log_file = os.getenv('LOG_FILE')
+    if not log_file:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        return None
+    
+    handler = logging.FileHandler(log_file)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    log_queue = queue.Queue(-1)
+    logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    return listener
+
+@functools.lru_cache(maxsize=1024)
+def buy_path(token_address: str) -> tuple:
+    """Uniswap path for swapping ETH into a token"""
+    return (WETH_ADDRESS, token_address)
+
+@functools.lru_cache(maxsize=1024)
+def sell_path(token_address: str) -> tuple:
+    """Uniswap path for swapping a token into ETH"""
+    return (token_address, WETH_ADDRESS)
+
+def encode_call(name: str, *args) -> str:
+    """Hex calldata for one of the CALL_SIGNATURES functions"""
+    return '0x' + (SELECTORS[name] + eth_abi.encode(CALL_SIGNATURES[name], args)).hex()
 
 class MEVProtectedBuyer:
     def __init__(self):
@@ -24,20 +117,65 @@ class MEVProtectedBuyer:
         self.wallet_address = Web3.to_checksum_address(os.getenv('WALLET_ADDRESS'))
         self.default_slippage = float(os.getenv('DEFAULT_SLIPPAGE', '0.5'))
         self.gas_multiplier = float(os.getenv('GAS_MULTIPLIER', '1.1'))
+        # Approve the router once per token instead of once per sell
+        self.unlimited_approval = os.getenv('UNLIMITED_APPROVAL', 'true').lower() == 'true'
         
-        # Initialize Web3
-        self.w3 = Web3(Web3.HTTPProvider(self.node_url))
+        # Initialize async Web3; the HTTP session is attached in __aenter__
+        self.w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(self.node_url))
+        self.session = None
+        self.chain_id = None
+        self.token_contracts = {}
+        self.token_meta = {}
+        self.token_meta_store = shelve.open(TRADER_META_CACHE)
+        self.rpc_cache = {}
+        self.fee_cache = None  # (block number, base fee, priority fee)
+        self.nonce = None  # Next nonce to use, tracked locally after seeding from the node
+        self.nonce_lock = asyncio.Lock()
         self.account: LocalAccount = Account.from_key(self.private_key)
         
         # Load contracts
         self.router = self.w3.eth.contract(
-            address=Web3.to_checksum_address(UNISWAP_V2_ROUTER),
+            address=UNISWAP_V2_ROUTER,
             abi=self.load_abi('UniswapV2Router02.json')
         )
+        self.multicall = self.w3.eth.contract(
+            address=MULTICALL_ADDRESS,
+            abi=self.load_abi('Multicall3.json')
+        )
         
         # Transaction settings
-        self.min_eth_balance = Web3.to_wei(0.01, 'ether')  # Keep 0.01 ETH for future gas
-        self.max_gas_price = Web3.to_wei(300, 'gwei')  # Maximum gas price willing to pay
+        self.min_eth_balance = MIN_ETH_BALANCE
+        self.max_gas_price = MAX_GAS_PRICE_WEI
+
+    async def __aenter__(self):
+        # Reuse a single keep-alive session for every RPC instead of one per request,
+        # so a trade pays the TCP/TLS handshake once
+        connector = aiohttp.TCPConnector(limit=32, ttl_dns_cache=300, keepalive_timeout=30)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=10)
+        )
+        try:
+            await self.w3.provider.cache_async_session(self.session)
+            
+            # The validation middleware looks up the chain id before every call and
+            # transaction; answer those from memory after the first request
+            self.w3.middleware_onion.add(
+                await async_construct_simple_cache_middleware(rpc_whitelist={'eth_chainId'}),
+                'chain_id_cache'
+            )
+            self.chain_id = await self.w3.eth.chain_id
+            await self.sync_nonce()
+        except Exception:
+            # __aexit__ doesn't run when entering fails, release what we opened
+            await self.session.close()
+            self.token_meta_store.close()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        self.token_meta_store.close()
 
     def validate_address(self, address: str) -> str:
         """Validate and convert address to checksum format"""
@@ -50,65 +188,252 @@ class MEVProtectedBuyer:
             raise ValueError(f"Invalid Ethereum address: {address}")
 
     def load_abi(self, filename):
-        """Load ABI from file"""
-        with open(f'abis/{filename}', 'r') as f:
-            return json.load(f)
+        """Load ABI parsed at import"""
+        return ABIS[filename]
 
     def get_token_contract(self, token_address: str):
-        """Get token contract instance"""
+        """Get token contract instance, reused across calls"""
         token_address = self.validate_address(token_address)
-        return self.w3.eth.contract(
-            address=token_address,
-            abi=self.load_abi('ERC20.json')
+        token_contract = self.token_contracts.get(token_address)
+        if token_contract is None:
+            token_contract = self.w3.eth.contract(
+                address=token_address,
+                abi=self.load_abi('ERC20.json')
+            )
+            self.token_contracts[token_address] = token_contract
+        return token_contract
+
+    def get_cached_token_metadata(self, token_address: str) -> Optional[dict]:
+        """Get token symbol, decimals and DOMAIN_SEPARATOR from cache, None if not cached"""
+        key = f"{self.chain_id}:{token_address}"
+        if key not in self.token_meta:
+            if key not in self.token_meta_store:
+                return None
+            self.token_meta[key] = self.token_meta_store[key]
+        return self.token_meta[key]
+
+    def cache_token_metadata(self, token_address: str, metadata: dict):
+        """Store token metadata; it never changes for a deployed token"""
+        key = f"{self.chain_id}:{token_address}"
+        self.token_meta[key] = metadata
+        self.token_meta_store[key] = metadata
+
+    def token_metadata_calls(self, token_address: str) -> list:
+        """Contract calls fetching the metadata cached by cache_token_metadata"""
+        token_contract = self.get_token_contract(token_address)
+        return [
+            token_contract.functions.symbol(),
+            token_contract.functions.decimals(),
+            token_contract.functions.DOMAIN_SEPARATOR()
+        ]
+
+    def store_token_metadata(self, token_address: str, results: list) -> Optional[dict]:
+        """Cache the results of token_metadata_calls, None if the token isn't a valid ERC20"""
+        symbol, decimals, domain_separator = results
+        if symbol is None or decimals is None:
+            return None
+        # DOMAIN_SEPARATOR is None for tokens without EIP-2612 permit
+        metadata = {'symbol': symbol, 'decimals': decimals, 'domain_separator': domain_separator}
+        self.cache_token_metadata(token_address, metadata)
+        return metadata
+
+    async def get_token_metadata(self, token_address: str) -> Optional[dict]:
+        """Get token metadata from cache, fetching it through read_calls otherwise"""
+        metadata = self.get_cached_token_metadata(token_address)
+        if metadata is None:
+            results = await self.read_calls(self.token_metadata_calls(token_address))
+            metadata = self.store_token_metadata(token_address, results)
+        return metadata
+
+    def decode_result(self, fn, return_data: bytes):
+        """Decode raw call output for a contract function, None if it failed"""
+        if not return_data:
+            return None
+        try:
+            output_types = [output['type'] for output in fn.abi['outputs']]
+            return self.w3.codec.decode(output_types, return_data)[0]
+        except Exception:
+            return None
+
+    async def aggregate(self, calls: list) -> list:
+        """Execute contract function calls in a single eth_call via Multicall3.
+
+        All calls observe the same block. Calls are allowed to fail individually;
+        failed or undecodable results are None.
+        """
+        results = await self.multicall.functions.aggregate3([
+            (fn.address, True, fn._encode_transaction_data()) for fn in calls
+        ]).call()
+        return [
+            self.decode_result(fn, return_data) if success else None
+            for fn, (success, return_data) in zip(calls, results)
+        ]
+
+    async def batch_rpc(self, requests: list) -> list:
+        """Send (method, params) requests as one JSON-RPC batch POST and return raw results in order.
+
+        Falls back to one request each when the node rejects batches.
+        """
+        payload = [
+            {'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params}
+            for i, (method, params) in enumerate(requests)
+        ]
+        try:
+            async with self.session.post(self.node_url, json=payload) as response:
+                response.raise_for_status()
+                body = await response.json(content_type=None)
+        except aiohttp.ClientResponseError:
+            # Some providers refuse JSON arrays with an HTTP 4xx (400, 405, 413)
+            body = None
+        
+        if isinstance(body, list):
+            responses = {item.get('id'): item for item in body}
+            responses = [responses.get(i, {}) for i in range(len(requests))]
+        else:
+            # Batching not supported by this node
+            responses = await asyncio.gather(*[
+                self.w3.provider.make_request(method, params) for method, params in requests
+            ])
+        
+        results = []
+        for (method, _), item in zip(requests, responses):
+            if 'result' not in item:
+                raise ValueError(f"{method} failed: {item.get('error')}")
+            results.append(item['result'])
+        return results
+
+    def quote_request(self, amount: int, path: tuple) -> tuple:
+        """JSON-RPC eth_call request for a router getAmountsOut quote, for batch_rpc"""
+        return 'eth_call', [{'to': self.router.address, 'data': encode_call('getAmountsOut', amount, path)}, 'latest']
+
+    def decode_quote(self, result) -> Optional[list]:
+        """Decode getAmountsOut output (hex string or bytes), None if the quote failed"""
+        if isinstance(result, str):
+            result = bytes.fromhex(result[2:])
+        try:
+            return list(eth_abi.decode(['uint256[]'], result)[0])
+        except Exception:
+            return None
+
+    async def read_calls(self, calls: list) -> list:
+        """Execute contract reads in one Multicall3 call when deployed, one eth_call each otherwise.
+
+        Failed reads are None either way.
+        """
+        try:
+            return await self.aggregate(calls)
+        except Exception:
+            # Multicall3 not deployed on this chain, read each value on its own
+            results = await asyncio.gather(*(fn.call() for fn in calls), return_exceptions=True)
+            return [None if isinstance(result, Exception) else result for result in results]
+
+    async def cached_rpc(self, key: str, ttl: float, fetch):
+        """Share one in-flight or recent RPC result per key for ttl seconds"""
+        entry = self.rpc_cache.get(key)
+        now = time.monotonic()
+        if entry is None or now - entry[0] >= ttl:
+            entry = (now, asyncio.ensure_future(fetch()))
+            self.rpc_cache[key] = entry
+        try:
+            return await entry[1]
+        except Exception:
+            if self.rpc_cache.get(key) is entry:
+                del self.rpc_cache[key]
+            raise
+
+    async def get_latest_block(self):
+        """Get the latest block, reused for LATEST_BLOCK_TTL seconds"""
+        return await self.cached_rpc('latest_block', LATEST_BLOCK_TTL, lambda: self.w3.eth.get_block('latest'))
+
+    async def sync_nonce(self):
+        """Seed the local nonce from the node's pending transaction count"""
+        self.nonce = await self.w3.eth.get_transaction_count(self.wallet_address, 'pending')
+
+    def reset_nonce(self):
+        """Drop the local nonce so the next transaction resyncs it from the node"""
+        self.nonce = None
+
+    async def next_nonce(self) -> int:
+        """Take the next nonce for a transaction about to be signed"""
+        async with self.nonce_lock:
+            if self.nonce is None:
+                await self.sync_nonce()
+            nonce = self.nonce
+            self.nonce += 1
+            return nonce
+
+    def rpc_error_message(self, error: Exception) -> str:
+        """Lower-cased JSON-RPC error message carried by a web3 ValueError"""
+        detail = error.args[0] if error.args else error
+        if isinstance(detail, dict):
+            detail = detail.get('message', detail)
+        return str(detail).lower()
+
+    async def transaction_known(self, tx_hash) -> bool:
+        """Check whether the node has seen a transaction"""
+        try:
+            await self.w3.eth.get_transaction(tx_hash)
+            return True
+        except TransactionNotFound:
+            return False
+
+    async def wait_for_receipt(self, tx_hash):
+        """Wait for a transaction receipt, polling every RECEIPT_POLL_LATENCY seconds"""
+        return await self.w3.eth.wait_for_transaction_receipt(
+            tx_hash,
+            timeout=RECEIPT_TIMEOUT,
+            poll_latency=RECEIPT_POLL_LATENCY
         )
 
-    def get_eth_balance(self) -> int:
+    async def get_token_balance(self, token_address: str) -> int:
+        """Get raw token balance of wallet"""
+        raw = await self.w3.eth.call({
+            'to': token_address,
+            'data': encode_call('balanceOf', self.wallet_address)
+        })
+        return eth_abi.decode(['uint256'], raw)[0]
+
+    async def get_eth_balance(self) -> int:
         """Get ETH balance of wallet"""
-        return self.w3.eth.get_balance(self.wallet_address)
+        return await self.w3.eth.get_balance(self.wallet_address)
 
-    def calculate_max_spend(self, gas_price: int) -> int:
+    async def calculate_max_spend(self, gas_price: int, balance: Optional[int] = None) -> int:
         """Calculate maximum amount we can spend while keeping minimum ETH for gas"""
-        balance = self.w3.eth.get_balance(self.wallet_address)
+        if balance is None:
+            balance = await self.w3.eth.get_balance(self.wallet_address)
         estimated_gas_cost = gas_price * 350000  # Estimated gas limit
-        max_spend = float(balance) - float(estimated_gas_cost) - float(self.min_eth_balance)
-        return max(0, int(max_spend))
+        max_spend = balance - estimated_gas_cost - self.min_eth_balance
+        return max(0, max_spend)
 
-    def estimate_gas_limit(self, txn) -> int:
+    async def estimate_gas_limit(self, txn) -> int:
         """Estimate gas limit with safety buffer"""
         try:
-            estimated = self.w3.eth.estimate_gas(txn)
+            estimated = await self.w3.eth.estimate_gas(txn)
             return int(estimated * 1.2)
+        except ContractLogicError:
+            # The transaction would revert, don't paper over it with the fallback
+            raise
         except Exception as e:
-            print(f"Gas estimation failed: {e}")
+            logger.warning(f"Gas estimation failed: {e}")
             return 350000  # Fallback gas limit
 
-    def get_optimal_gas_price(self) -> Tuple[int, int]:
+    async def get_optimal_gas_price(self) -> Tuple[int, int]:
         """Get optimal gas price with dynamic adjustment"""
         try:
-            # Get base fee from latest block
-            latest_block = self.w3.eth.get_block('latest')
-            base_fee = latest_block['baseFeePerGas']
-            
-            # Get pending transactions for gas price analysis
-            pending_txns = self.w3.eth.get_block('pending')
-            if pending_txns and 'transactions' in pending_txns:
-                pending_gas_prices = []
-                for tx_hash in pending_txns['transactions'][:10]:  # Sample last 10 transactions
-                    try:
-                        tx = self.w3.eth.get_transaction(tx_hash)
-                        if 'maxFeePerGas' in tx:
-                            pending_gas_prices.append(tx['maxFeePerGas'])
-                    except Exception:
-                        continue
+            # Fee history only changes with the chain tip, reuse it until a new block arrives
+            block_number = (await self.get_latest_block())['number']
+            if self.fee_cache is None or self.fee_cache[0] != block_number:
+                # Base fee of the next block and median priority fee paid over the last 5 blocks
+                fee_history = await self.w3.eth.fee_history(5, block_number, [50])
+                base_fee = fee_history['baseFeePerGas'][-1]
                 
-                if pending_gas_prices:
-                    # Use median of pending transactions as reference
-                    median_gas_price = sorted(pending_gas_prices)[len(pending_gas_prices)//2]
-                    priority_fee = min(median_gas_price - base_fee, Web3.to_wei(3, 'gwei'))
+                rewards = [reward[0] for reward in fee_history['reward'] if reward]
+                if rewards:
+                    priority_fee = min(int(statistics.median(rewards)), MAX_PRIORITY_FEE)
                 else:
-                    priority_fee = Web3.to_wei(2, 'gwei')
-            else:
-                priority_fee = Web3.to_wei(2, 'gwei')
+                    priority_fee = DEFAULT_PRIORITY_FEE
+                self.fee_cache = (block_number, base_fee, priority_fee)
+            _, base_fee, priority_fee = self.fee_cache
             
             # Calculate max fee (base fee + priority fee + buffer)
             max_fee = min(
@@ -119,192 +444,227 @@ class MEVProtectedBuyer:
             return max_fee, priority_fee
             
         except Exception as e:
-            print(f"Error getting optimal gas price: {e}")
+            logger.warning(f"Error getting optimal gas price: {e}")
             # Fallback to simple calculation
-            gas_price = self.w3.eth.gas_price
+            gas_price = await self.w3.eth.gas_price
             return (
                 min(int(gas_price * 1.2), self.max_gas_price),
                 int(gas_price * 0.1)
             )
 
-    def check_token_liquidity(self, token_address: str, eth_amount: float) -> Tuple[bool, float, str]:
-        """Check if token has sufficient liquidity"""
+    async def check_token_liquidity(self, token_address: str, eth_amount: float) -> Tuple[bool, float, str, Optional[list]]:
+        """Check if token has sufficient liquidity, returning the getAmountsOut quote on success"""
         try:
             # Validate token address
             token_address = self.validate_address(token_address)
             amount_in_wei = Web3.to_wei(eth_amount, 'ether')
 
-            # Get token info first
+            # Fetch both quotes, plus token info unless cached, in one eth_call so they see the same reserves
+            # (separate calls on chains without Multicall3)
             token_contract = self.get_token_contract(token_address)
-            try:
-                symbol = token_contract.functions.symbol().call()
-                decimals = token_contract.functions.decimals().call()
-            except Exception as e:
-                return False, 0, "Could not get token information. This might not be a valid ERC20 token."
+            metadata = self.get_cached_token_metadata(token_address)
+            calls = [
+                self.router.functions.getAmountsOut(amount_in_wei, buy_path(token_address)),
+                token_contract.functions.totalSupply(),
+                self.router.functions.getAmountsOut(TENTH_ETHER, buy_path(token_address))
+            ]
+            if metadata is None:
+                calls += self.token_metadata_calls(token_address)
+            results = await self.read_calls(calls)
+            amounts, total_supply, small_amounts = results[:3]
+            
+            if metadata is None:
+                metadata = self.store_token_metadata(token_address, results[3:])
+            if metadata is None:
+                return False, 0, "Could not get token information. This might not be a valid ERC20 token.", None
+            symbol, decimals = metadata['symbol'], metadata['decimals']
 
             # Check if there's a Uniswap V2 pair
+            if amounts is None or small_amounts is None:
+                return False, 0, "Error checking Uniswap liquidity: no Uniswap V2 pair found for token", None
+
             try:
-                # Get current reserves and price impact
-                amounts = self.router.functions.getAmountsOut(
-                    amount_in_wei,
-                    [WETH_ADDRESS, token_address]
-                ).call()
-                
                 # Calculate expected output
                 tokens_out = amounts[1]
                 
-                # Get total supply and calculate liquidity metrics
-                total_supply = token_contract.functions.totalSupply().call()
-                if total_supply == 0:
-                    return False, 0, "Token has no total supply"
+                # Check total supply and calculate liquidity metrics
+                if not total_supply:
+                    return False, 0, "Token has no total supply", None
+                
+                # More lenient liquidity check
+                if tokens_out == 0:
+                    return False, 0, "No tokens returned for trade. Insufficient liquidity.", None
 
                 # Calculate liquidity ratio and price impact
                 liquidity_ratio = float(tokens_out) / float(total_supply)
                 
                 # Get current price in ETH
-                one_token_price = Web3.to_wei(1, 'ether') / amounts[1]
-                
-                # More lenient liquidity check
-                if tokens_out == 0:
-                    return False, 0, "No tokens returned for trade. Insufficient liquidity."
+                one_token_price = ONE_ETHER / amounts[1]
                 
                 # Check if price impact is reasonable (less than 10%)
-                small_amount = Web3.to_wei(0.1, 'ether')
-                small_amounts = self.router.functions.getAmountsOut(
-                    small_amount,
-                    [WETH_ADDRESS, token_address]
-                ).call()
-                
                 price_impact = abs(1 - (amounts[1] / eth_amount) / (small_amounts[1] / 0.1))
                 
                 if price_impact > 0.10:  # 10% price impact threshold
-                    return False, liquidity_ratio, f"High price impact: {price_impact*100:.2f}%. Trade might be front-run."
+                    return False, liquidity_ratio, f"High price impact: {price_impact*100:.2f}%. Trade might be front-run.", None
                 
                 # Print token information
-                print(f"\nToken Information:")
-                print(f"Symbol: {symbol}")
-                print(f"Decimals: {decimals}")
-                print(f"Current price: {one_token_price:.8f} ETH")
-                print(f"Expected output: {Web3.from_wei(tokens_out, 'ether')} tokens")
-                print(f"Price impact: {price_impact*100:.2f}%")
+                logger.info(
+                    f"\nToken Information:\n"
+                    f"Symbol: {symbol}\n"
+                    f"Decimals: {decimals}\n"
+                    f"Current price: {one_token_price:.8f} ETH\n"
+                    f"Expected output: {Web3.from_wei(tokens_out, 'ether')} tokens\n"
+                    f"Price impact: {price_impact*100:.2f}%"
+                )
                 
-                return True, liquidity_ratio, "Sufficient liquidity"
+                return True, liquidity_ratio, "Sufficient liquidity", amounts
                 
             except Exception as e:
-                return False, 0, f"Error checking Uniswap liquidity: {str(e)}"
+                return False, 0, f"Error checking Uniswap liquidity: {str(e)}", None
             
         except Exception as e:
-            return False, 0, f"Error checking liquidity: {str(e)}"
+            return False, 0, f"Error checking liquidity: {str(e)}", None
 
-    def build_optimized_transaction(self, token_address: str, eth_amount: float, slippage: float) -> Optional[dict]:
+    async def build_optimized_transaction(self, token_address: str, eth_amount: float, slippage: float) -> Optional[dict]:
         """Build optimized transaction with all checks"""
         try:
             # Validate addresses
             token_address = self.validate_address(token_address)
             
-            # Check liquidity
-            has_liquidity, liquidity_ratio, message = self.check_token_liquidity(token_address, eth_amount)
-            if not has_liquidity:
-                print("Insufficient liquidity for trade")
-                return None
-            
-            # Get optimal gas prices
-            max_fee, priority_fee = self.get_optimal_gas_price()
-            
-            # Check if we can afford the transaction
-            max_spend = self.calculate_max_spend(max_fee)
+            # Work out what we can afford before spending any calls on quotes
+            (max_fee, priority_fee), latest_block, balance = await asyncio.gather(
+                self.get_optimal_gas_price(),
+                self.get_latest_block(),
+                self.get_eth_balance()
+            )
+            max_spend = await self.calculate_max_spend(max_fee, balance)
             amount_in_wei = Web3.to_wei(eth_amount, 'ether')
             if max_spend < amount_in_wei:
                 adjusted_amount = Web3.from_wei(max_spend, 'ether')
-                print(f"Adjusting amount to {adjusted_amount} ETH due to gas costs")
+                logger.info(f"Adjusting amount to {adjusted_amount} ETH due to gas costs")
                 eth_amount = float(adjusted_amount)
                 amount_in_wei = Web3.to_wei(eth_amount, 'ether')
             
             if eth_amount <= 0:
-                print("Insufficient funds for transaction after gas costs")
+                logger.warning("Insufficient funds for transaction after gas costs")
+                return None
+            
+            # Check liquidity for the amount we will actually spend, its quote sets the minimum output
+            has_liquidity, liquidity_ratio, message, amounts = await self.check_token_liquidity(token_address, eth_amount)
+            if not has_liquidity:
+                logger.warning("Insufficient liquidity for trade")
                 return None
             
             # Calculate minimum tokens to receive
-            amounts = self.router.functions.getAmountsOut(
-                amount_in_wei,
-                [WETH_ADDRESS, token_address]
-            ).call()
-            min_tokens = int(float(amounts[1]) * (1 - float(slippage)/100))
+            path = buy_path(token_address)
+            # Slippage in basis points keeps the math in integer token units
+            min_tokens = amounts[1] * (10000 - round(slippage * 100)) // 10000
             
             # Build transaction
-            deadline = self.w3.eth.get_block('latest')['timestamp'] + 180
-            unsigned_txn = self.router.functions.swapExactETHForTokens(
-                min_tokens,
-                [WETH_ADDRESS, token_address],
-                self.wallet_address,
-                deadline
-            ).build_transaction({
+            deadline = latest_block['timestamp'] + 180
+            unsigned_txn = {
                 'from': self.wallet_address,
+                'to': self.router.address,
+                'chainId': self.chain_id,
                 'value': amount_in_wei,
+                'data': encode_call('swapExactETHForTokens', min_tokens, path, self.wallet_address, deadline),
                 'maxFeePerGas': max_fee,
                 'maxPriorityFeePerGas': priority_fee,
-                'nonce': self.w3.eth.get_transaction_count(self.wallet_address),
                 'type': 2  # EIP-1559
-            })
+            }
             
             # Estimate and set gas limit
-            gas_limit = self.estimate_gas_limit(unsigned_txn)
+            gas_limit = await self.estimate_gas_limit(unsigned_txn)
             unsigned_txn['gas'] = gas_limit
             
+            # Take the nonce last so an aborted build doesn't leave a gap
+            unsigned_txn['nonce'] = await self.next_nonce()
+            
             return unsigned_txn
             
         except Exception as e:
-            print(f"Error building transaction: {e}")
+            logger.error(f"Error building transaction: {e}")
             return None
 
-    def buy_token_protected(self, token_address: str, eth_amount: float, slippage: float = None) -> Optional[str]:
+    async def buy_token_protected(self, token_address: str, eth_amount: float, slippage: float = None) -> Optional[str]:
         """Execute optimized token purchase"""
         try:
             slippage = slippage if slippage is not None else self.default_slippage
             
             # Build optimized transaction
-            unsigned_txn = self.build_optimized_transaction(token_address, eth_amount, slippage)
+            unsigned_txn = await self.build_optimized_transaction(token_address, eth_amount, slippage)
             if not unsigned_txn:
                 return None
             
             # Sign transaction
             signed_txn = self.w3.eth.account.sign_transaction(unsigned_txn, self.private_key)
             
-            print("\nSubmitting optimized transaction...")
+            logger.info("\nSubmitting optimized transaction...")
             
-            # Submit with retries
-            for attempt in range(3):
+            # Submit with retries, re-signing only when the node asks for a new nonce or fee
+            for attempt in range(MAX_SEND_ATTEMPTS):
                 try:
-                    tx_hash = self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-                    print(f"Transaction hash: {tx_hash.hex()}")
-                    
-                    # Wait for confirmation
-                    print("Waiting for confirmation...")
-                    receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
-                    
-                    if receipt['status'] == 1:
-                        print("\nTransaction successful!")
-                        token_contract = self.get_token_contract(token_address)
-                        token_balance = token_contract.functions.balanceOf(self.wallet_address).call()
-                        print(f"Received {Web3.from_wei(token_balance, 'ether')} tokens")
-                        return tx_hash.hex()
-                    else:
-                        print("\nTransaction failed!")
-                        return None
-                        
-                except Exception as e:
-                    if attempt < 2:
-                        print(f"Attempt {attempt + 1} failed, retrying...")
-                        time.sleep(1)
+                    tx_hash = await self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
+                    break
+                except ValueError as e:
+                    last_error = e
+                    error = self.rpc_error_message(e)
+                    if 'already known' in error:
+                        # An earlier attempt reached the node after all
+                        tx_hash = signed_txn.hash
+                        break
+                    if 'nonce too low' in error:
+                        if await self.transaction_known(signed_txn.hash):
+                            tx_hash = signed_txn.hash
+                            break
+                        self.reset_nonce()
+                        unsigned_txn['nonce'] = await self.next_nonce()
+                    elif 'underpriced' in error:
+                        # Replacements must raise both fees by at least 12.5%
+                        unsigned_txn['maxPriorityFeePerGas'] = unsigned_txn['maxPriorityFeePerGas'] * 9 // 8 + 1
+                        unsigned_txn['maxFeePerGas'] = unsigned_txn['maxFeePerGas'] * 9 // 8 + 1
+                        if unsigned_txn['maxFeePerGas'] > self.max_gas_price:
+                            logger.error(f"Transaction underpriced at the maximum gas price: {e}")
+                            self.reset_nonce()
+                            return None
                     else:
-                        print(f"All attempts failed: {e}")
+                        # Insufficient funds, reverts and the like will not succeed on retry
+                        logger.error(f"Transaction rejected: {e}")
+                        self.reset_nonce()
                         return None
+                    signed_txn = self.w3.eth.account.sign_transaction(unsigned_txn, self.private_key)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    # Transport error, resend the same signed transaction
+                    last_error = e
+                
+                if attempt == MAX_SEND_ATTEMPTS - 1:
+                    logger.error(f"All attempts failed: {last_error}")
+                    self.reset_nonce()
+                    return None
+                logger.warning(f"Attempt {attempt + 1} failed, retrying...")
+                await asyncio.sleep(0.2 * 2 ** attempt + random.random() * 0.1)
+            
+            logger.info(f"Transaction hash: {tx_hash.hex()}")
+            
+            # Wait for confirmation
+            logger.info("Waiting for confirmation...")
+            receipt = await self.wait_for_receipt(tx_hash)
+            
+            if receipt['status'] == 1:
+                logger.info("\nTransaction successful!")
+                token_balance = await self.get_token_balance(token_address)
+                logger.info(f"Received {Web3.from_wei(token_balance, 'ether')} tokens")
+                return tx_hash.hex()
+            else:
+                logger.error("\nTransaction failed!")
+                return None
             
         except Exception as e:
-            print(f"\nError buying token: {e}")
+            logger.error(f"\nError buying token: {e}")
+            self.reset_nonce()
             return None
 
-    def sell_tokens(self, token_address: str, amount: float, min_eth_received: Optional[float] = None, slippage: Optional[float] = None) -> dict:
+    async def sell_tokens(self, token_address: str, amount: float, min_eth_received: Optional[float] = None, slippage: Optional[float] = None) -> dict:
         """
         Sell ERC20 tokens for ETH with MEV protection
         
@@ -314,6 +674,7 @@ class MEVProtectedBuyer:
             min_eth_received: Minimum amount of ETH to receive (optional)
             slippage: Custom slippage tolerance (optional)
         """
+        tx_hash = None
         try:
             # Validate inputs
             token_address = Web3.to_checksum_address(token_address)
@@ -323,15 +684,17 @@ class MEVProtectedBuyer:
                 raise ValueError("Slippage must be between 0 and 100")
 
             # Get token contract
-            token_contract = self.w3.eth.contract(
-                address=token_address,
-                abi=self.load_abi('ERC20.json')
-            )
+            token_contract = self.get_token_contract(token_address)
             
-            # Get token info and validate
-            symbol = token_contract.functions.symbol().call()
-            decimals = token_contract.functions.decimals().call()
-            token_balance = token_contract.functions.balanceOf(self.wallet_address).call()
+            # Get token info, balance and router allowance together
+            metadata, token_balance, allowance = await asyncio.gather(
+                self.get_token_metadata(token_address),
+                self.get_token_balance(token_address),
+                token_contract.functions.allowance(self.wallet_address, self.router.address).call()
+            )
+            if metadata is None:
+                raise ValueError("Could not get token information. This might not be a valid ERC20 token.")
+            symbol, decimals = metadata['symbol'], metadata['decimals']
             
             if token_balance == 0:
                 raise ValueError(f"No {symbol} tokens found in wallet")
@@ -341,70 +704,83 @@ class MEVProtectedBuyer:
             if amount_in_token_units > token_balance:
                 raise ValueError(f"Insufficient {symbol} balance. You have {token_balance / (10 ** decimals):.8f} {symbol}")
 
-            # Check token approval
-            allowance = token_contract.functions.allowance(
-                self.wallet_address,
-                self.router_address
-            ).call()
+            # Get price quote and gas price in one batched POST alongside the latest block;
+            # the priority fee comes from the cached fee history
+            latest_block, (_, priority_fee), (gas_price, quote) = await asyncio.gather(
+                self.get_latest_block(),
+                self.get_optimal_gas_price(),
+                self.batch_rpc([
+                    ('eth_gasPrice', []),
+                    self.quote_request(amount_in_token_units, sell_path(token_address))
+                ])
+            )
+            gas_price = int(gas_price, 16)
+            amounts_out = self.decode_quote(quote)
+            if amounts_out is None:
+                raise ValueError("Could not get a price quote from Uniswap")
+            expected_eth = amounts_out[1]
 
-            # Approve tokens if needed
+            # Approve tokens if needed; the swap is queued right behind it with the next nonce
+            approve_tx_hash = None
             if allowance < amount_in_token_units:
-                print(f"Approving {symbol} for trading...")
-                approve_txn = token_contract.functions.approve(
-                    self.router_address,
-                    amount_in_token_units
-                ).build_transaction({
+                logger.info(f"Approving {symbol} for trading...")
+                approve_amount = MAX_UINT256 if self.unlimited_approval else amount_in_token_units
+                approve_txn = {
                     'from': self.wallet_address,
-                    'nonce': self.w3.eth.get_transaction_count(self.wallet_address),
+                    'to': token_address,
+                    'chainId': self.chain_id,
+                    'value': 0,
+                    'data': encode_call('approve', self.router.address, approve_amount),
+                    'nonce': await self.next_nonce(),
                     'gas': 100000,  # Standard gas limit for approvals
-                    'maxFeePerGas': self.w3.eth.gas_price,
-                    'maxPriorityFeePerGas': self.w3.eth.gas_price
-                })
+                    'maxFeePerGas': gas_price,
+                    'maxPriorityFeePerGas': gas_price
+                }
                 
                 signed_approve_txn = self.w3.eth.account.sign_transaction(approve_txn, self.private_key)
-                approve_tx_hash = self.w3.eth.send_raw_transaction(signed_approve_txn.rawTransaction)
-                self.w3.eth.wait_for_transaction_receipt(approve_tx_hash)
-
-            # Get price quote
-            amounts_out = self.router.functions.getAmountsOut(
-                amount_in_token_units,
-                [token_address, WETH_ADDRESS]
-            ).call()
-            expected_eth = amounts_out[1]
+                approve_tx_hash = await self.w3.eth.send_raw_transaction(signed_approve_txn.rawTransaction)
 
             # Calculate minimum ETH to receive
             if min_eth_received is None:
-                min_eth_received = int(expected_eth * (1 - slippage/100))
+                min_eth_received = expected_eth * (10000 - round(slippage * 100)) // 10000
 
             # Prepare transaction parameters
             deadline = int(time.time() + 300)  # 5 minutes
             
-            # Get current gas prices
-            base_fee = self.w3.eth.get_block('latest')['baseFeePerGas']
-            priority_fee = self.w3.eth.max_priority_fee
+            # Dynamic gas pricing from the latest base fee
+            base_fee = latest_block['baseFeePerGas']
             max_fee_per_gas = base_fee * 2 + priority_fee  # Dynamic gas pricing
 
             # Build the swap transaction
-            swap_txn = self.router.functions.swapExactTokensForETH(
-                amount_in_token_units,
-                min_eth_received,
-                [token_address, WETH_ADDRESS],
-                self.wallet_address,
-                deadline
-            ).build_transaction({
+            swap_txn = {
                 'from': self.wallet_address,
-                'nonce': self.w3.eth.get_transaction_count(self.wallet_address),
+                'to': self.router.address,
+                'chainId': self.chain_id,
+                'value': 0,
+                'data': encode_call(
+                    'swapExactTokensForETH',
+                    amount_in_token_units,
+                    min_eth_received,
+                    sell_path(token_address),
+                    self.wallet_address,
+                    deadline
+                ),
+                'nonce': await self.next_nonce(),
                 'maxFeePerGas': max_fee_per_gas,
                 'maxPriorityFeePerGas': priority_fee,
                 'gas': 350000  # Estimated gas limit for swaps
-            })
+            }
 
             # Sign and send transaction
             signed_txn = self.w3.eth.account.sign_transaction(swap_txn, self.private_key)
-            tx_hash = self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
+            tx_hash = await self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
             
-            # Wait for transaction receipt
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            # Wait for the approval, then the swap mined after it
+            if approve_tx_hash is not None:
+                approve_receipt = await self.wait_for_receipt(approve_tx_hash)
+                if approve_receipt['status'] != 1:
+                    raise Exception("Approval failed")
+            receipt = await self.wait_for_receipt(tx_hash)
             
             if receipt['status'] == 1:
                 eth_amount = Web3.from_wei(expected_eth, 'ether')
@@ -421,72 +797,85 @@ class MEVProtectedBuyer:
                 raise Exception("Transaction failed")
 
         except Exception as e:
-            return {
+            self.reset_nonce()
+            result = {
                 'success': False,
                 'error': str(e)
             }
+            if tx_hash is not None:
+                # The swap is already broadcast (e.g. behind a failed approval), let the caller track it
+                result['transaction_hash'] = tx_hash.hex()
+            return result
 
-def main():
-    try:
-        buyer = MEVProtectedBuyer()
+async def menu(buyer: MEVProtectedBuyer):
+    while True:
+        print("\nMEV Protected Trading Menu:")
+        print("1. Buy tokens")
+        print("2. Sell tokens")
+        print("3. Check token price")
+        print("4. Exit")
         
-        while True:
-            print("\nMEV Protected Trading Menu:")
-            print("1. Buy tokens")
-            print("2. Sell tokens")
-            print("3. Check token price")
-            print("4. Exit")
-            
-            choice = input("\nEnter your choice (1-4): ")
+        choice = input("\nEnter your choice (1-4): ")
+        
+        if choice == "1":
+            token_address = input("Enter token address to buy: ").strip()
+            eth_amount = float(input("Enter ETH amount to spend: "))
+            slippage = input("Enter slippage tolerance % (default 0.5): ").strip()
+            slippage = float(slippage) if slippage else None
             
-            if choice == "1":
-                token_address = input("Enter token address to buy: ").strip()
-                eth_amount = float(input("Enter ETH amount to spend: "))
-                slippage = input("Enter slippage tolerance % (default 0.5): ").strip()
-                slippage = float(slippage) if slippage else None
-                
-                result = buyer.buy_token_protected(token_address, eth_amount, slippage=slippage)
-                if result:
-                    print("\nTransaction successful!")
-                    print(f"Bought tokens with transaction hash: {result}")
-                else:
-                    print("\nTransaction failed")
+            result = await buyer.buy_token_protected(token_address, eth_amount, slippage=slippage)
+            if result:
+                print("\nTransaction successful!")
+                print(f"Bought tokens with transaction hash: {result}")
+            else:
+                print("\nTransaction failed")
+        
+        elif choice == "2":
+            token_address = input("Enter token address to sell: ").strip()
+            amount = float(input("Enter token amount to sell: "))
+            slippage = input("Enter slippage tolerance % (default 0.5): ").strip()
+            slippage = float(slippage) if slippage else None
             
-            elif choice == "2":
-                token_address = input("Enter token address to sell: ").strip()
-                amount = float(input("Enter token amount to sell: "))
-                slippage = input("Enter slippage tolerance % (default 0.5): ").strip()
-                slippage = float(slippage) if slippage else None
-                
-                result = buyer.sell_tokens(token_address, amount, slippage=slippage)
-                if result['success']:
-                    print("\nTransaction successful!")
-                    print(f"Sold: {result['token_amount']:.8f} {result['token_symbol']}")
-                    print(f"Received: {result['eth_received']:.8f} ETH")
+            result = await buyer.sell_tokens(token_address, amount, slippage=slippage)
+            if result['success']:
+                print("\nTransaction successful!")
+                print(f"Sold: {result['token_amount']:.8f} {result['token_symbol']}")
+                print(f"Received: {result['eth_received']:.8f} ETH")
+                print(f"Transaction hash: {result['transaction_hash']}")
+            else:
+                print(f"\nTransaction failed: {result['error']}")
+                if 'transaction_hash' in result:
                     print(f"Transaction hash: {result['transaction_hash']}")
-                else:
-                    print(f"\nTransaction failed: {result['error']}")
-            
-            elif choice == "3":
-                token_address = input("Enter token address: ").strip()
-                eth_amount = float(input("Enter ETH amount for price check: "))
-                result = buyer.check_token_liquidity(token_address, eth_amount)
-                if result[0]:
-                    print(f"\nPrice quote for {eth_amount} ETH:")
-                    print(f"Expected tokens: {Web3.from_wei(result[1], 'ether')} tokens")
-                    print(f"Price impact: {result[2]}")
-                else:
-                    print(f"\nPrice check failed: {result[2]}")
-            
-            elif choice == "4":
-                print("\nGoodbye!")
-                break
-            
+        
+        elif choice == "3":
+            token_address = input("Enter token address: ").strip()
+            eth_amount = float(input("Enter ETH amount for price check: "))
+            has_liquidity, liquidity_ratio, message, amounts = await buyer.check_token_liquidity(token_address, eth_amount)
+            if has_liquidity:
+                print(f"\nPrice quote for {eth_amount} ETH:")
+                print(f"Expected tokens: {Web3.from_wei(amounts[1], 'ether')} tokens")
+                print(f"Liquidity ratio: {liquidity_ratio:.8f}")
             else:
-                print("\nInvalid choice. Please try again.")
-                
+                print(f"\nPrice check failed: {message}")
+        
+        elif choice == "4":
+            print("\nGoodbye!")
+            break
+        
+        else:
+            print("\nInvalid choice. Please try again.")
+
+async def main():
+    listener = setup_logging()
+    try:
+        async with MEVProtectedBuyer() as buyer:
+            await menu(buyer)
     except Exception as e:
         print(f"An error occurred: {e}")
+    finally:
+        # Flush queued log records before exiting
+        if listener is not None:
+            listener.stop()
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())